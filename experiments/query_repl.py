@@ -1,14 +1,34 @@
+import email
+from email import policy
 import os
 import readline
 from whoosh.qparser import QueryParser
 from whoosh.index import open_dir
 
 HISTFILE = os.path.join(os.path.dirname(__file__), "query.history")
+# Directory of the MBOX files named by the index's mbox_file field; see MBOX_PATH in index_mbox.py
+MBOX_DIR = os.path.join(os.path.dirname(__file__), "../takeout-downloads/my-gmail/unzipped")
 try:
     readline.read_history_file(HISTFILE)
 except FileNotFoundError:
     pass
 
+def read_body(mbox, extents):
+    """
+    Read one message from an open MBOX by its stored extents and return its text body.
+    The body isn't stored in the index, so this is how it's recovered for highlighting.
+    """
+    start, stop = extents
+    mbox.seek(start)
+    raw = mbox.read(stop - start)
+    # Skip the 'From ' line; the headers start on the next line
+    msg = email.message_from_bytes(raw[raw.find(b"\n") + 1:], policy=policy.default)
+    try:
+        text_part = msg.get_body(preferencelist=('plain',))
+        return text_part.get_content() if text_part else ''
+    except (LookupError, ValueError):
+        return ''
+
 def run_repl(ix):
     help_text = '''\nWhoosh Email Index REPL Help
 Type your search query, or 'exit' to quit. You can search on:
@@ -30,6 +50,7 @@ Type 'help' to see this message again.
     print("\nWhoosh Email Index REPL. Type your search query, or 'exit' to quit.")
     print(help_text)
     qp = QueryParser("body", schema=ix.schema)
+    mboxes = {}
     with ix.searcher() as searcher:
         while True:
             try:
@@ -65,13 +86,24 @@ Type 'help' to see this message again.
                     print(f"    From: {hit['sender']} | To: {hit['recipients']}")
                     print(f"    Key: {hit['msg_key']}")
                     print(f"    MBOX Message Extents: {hit['mbox_message_extents']}")
-                    print(f"    {hit.highlights('body', top=2)}\n")
+                    try:
+                        mbox = mboxes.get(hit['mbox_file'])
+                        if mbox is None:
+                            mbox = mboxes[hit['mbox_file']] = open(os.path.join(MBOX_DIR, hit['mbox_file']), 'rb')
+                        body = read_body(mbox, hit['mbox_message_extents'])
+                    except OSError as e:
+                        # The MBOX has moved, or MBOX_DIR isn't where it was indexed from
+                        print(f"    (No highlights: {e})\n")
+                        continue
+                    print(f"    {hit.highlights('body', text=body, top=2)}\n")
                 if end >= total:
                     break
                 inp = input(f"-- More ({end}/{total}) -- Press Enter for next page, 'q' to quit: ")
                 if inp.strip().lower() == 'q':
                     break
                 page += 1
+    for mbox in mboxes.values():
+        mbox.close()
     try:
         readline.write_history_file(HISTFILE)
     except Exception:
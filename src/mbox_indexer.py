@@ -15,19 +15,318 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import re
+import mmap
 import threading
-from typing import Callable, List, Optional, Any, Dict
-import mailbox
+import functools
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+from types import MappingProxyType
+from typing import Callable, Iterator, List, Mapping, Optional, Any, Dict, Tuple
 from whoosh.fields import Schema, TEXT, ID, DATETIME, STORED, KEYWORD
 from whoosh.index import create_in, open_dir
-from whoosh.analysis import StemmingAnalyzer
+from whoosh.analysis import Analyzer, StandardAnalyzer, StemFilter, StemmingAnalyzer
+from whoosh.lang.porter import stem
 from email.message import Message as EmailMessage
 from email.utils import parsedate_to_datetime
 from email.header import decode_header, make_header
-from email.parser import Parser
+from email import message_from_bytes
 import logging
 import json
 
+MBOX_SEPARATOR = b"\nFrom "
+PROGRESS_INTERVAL_BYTES = 1 << 20
+# Below this size a parallel scan costs more in process start-up than it saves
+PARALLEL_SCAN_MIN_BYTES = 64 << 20
+# Below this size, parsing in the indexer thread is quicker than starting parse worker processes
+PARALLEL_PARSE_MIN_BYTES = 16 << 20
+# Messages sent to a parse worker per round trip; large enough to amortise the inter-process overhead
+PARSE_CHUNK_SIZE = 64
+# Distinct words whose stems are kept by cached_stem, in each process that analyses text
+STEM_CACHE_SIZE = 200_000
+# Compiled once at import; label and header handling runs for every message in the MBOX
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _advise_sequential(mm: mmap.mmap) -> None:
+    # Ask for aggressive readahead where the platform supports it (not on Windows)
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+
+def scan_message_offsets(mbox_path: str, progress_callback: Optional[Callable[[int], None]] = None, workers: int = 1) -> array:
+    """
+    Return the byte offset of each message (its 'From ' line) in an MBOX file.
+    The file is memory-mapped and scanned with bytes.find, which runs in C rather than a Python line loop.
+    With workers > 1, a large file is split into ranges that are scanned in parallel by separate processes.
+    Offsets are positions in the file on disk, so a gzipped MBOX (*.gz) is rejected with a ValueError.
+    progress_callback, if given, receives a percentage roughly every megabyte scanned.
+    """
+    if mbox_path.endswith('.gz'):
+        raise ValueError(f"Compressed MBOX files can't be indexed; decompress it first: {mbox_path}")
+    offsets = array('q')
+    size = os.path.getsize(mbox_path)
+    if size == 0:
+        return offsets
+    if workers > 1 and size >= PARALLEL_SCAN_MIN_BYTES:
+        _scan_parallel_offsets(mbox_path, size, workers, offsets, progress_callback)
+        if progress_callback:
+            progress_callback(100)
+        return offsets
+    with open(mbox_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _advise_sequential(mm)
+        size = len(mm)
+        if mm[:5] == b"From ":
+            offsets.append(0)
+        next_report = PROGRESS_INTERVAL_BYTES
+        pos = mm.find(MBOX_SEPARATOR)
+        while pos != -1:
+            offsets.append(pos + 1)
+            if progress_callback and pos >= next_report:
+                progress_callback(pos * 100 // size)
+                next_report = pos + PROGRESS_INTERVAL_BYTES
+            pos = mm.find(MBOX_SEPARATOR, pos + 1)
+    if progress_callback:
+        progress_callback(100)
+    return offsets
+
+def _scan_range_offsets(mbox_path: str, start: int, end: int) -> array:
+    # Runs in a worker process: each worker maps the file itself, so no file data crosses processes.
+    # A separator belongs to this range if its newline is in [start, end), even if it runs past end.
+    offsets = array('q')
+    with open(mbox_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _advise_sequential(mm)
+        limit = min(end + len(MBOX_SEPARATOR) - 1, len(mm))
+        pos = mm.find(MBOX_SEPARATOR, start, limit)
+        while pos != -1:
+            offsets.append(pos + 1)
+            pos = mm.find(MBOX_SEPARATOR, pos + 1, limit)
+    return offsets
+
+def _scan_parallel_offsets(mbox_path: str, size: int, workers: int, offsets: array, progress_callback: Optional[Callable[[int], None]]) -> None:
+    with open(mbox_path, 'rb') as f:
+        if f.read(5) == b"From ":
+            offsets.append(0)
+    step = -(-size // workers)
+    ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+    results: Dict[int, array] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_scan_range_offsets, mbox_path, start, end): i for i, (start, end) in enumerate(ranges)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if progress_callback:
+                progress_callback(len(results) * 100 // len(ranges))
+    for i in range(len(ranges)):
+        offsets.extend(results[i])
+
+def mbox_message_extents(mbox_path: str, workers: int = 1, progress_callback: Optional[Callable[[int], None]] = None) -> List[Tuple[int, int]]:
+    """
+    Return the (start, stop) byte extents of each message in an MBOX, as mailbox.mbox records them:
+    start is the 'From ' line; stop is the next 'From ' line (or the end of the file), less the newline
+    of the blank line before it, if there is one.
+    Extents are offsets in the file on disk, so a gzipped MBOX is rejected rather than indexed.
+    :param workers: Number of processes used to scan a large MBOX for separators.
+    :param progress_callback: Receives the percentage of the file scanned, as for scan_message_offsets.
+    """
+    offsets = scan_message_offsets(mbox_path, progress_callback=progress_callback, workers=workers)
+    if not offsets:
+        return []
+    with open(mbox_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        stops = [offset - 1 if mm[offset - 2:offset] == b"\n\n" else offset for offset in offsets[1:]]
+        stops.append(size - 1 if mm[size - 2:size] == b"\n\n" else size)
+    return list(zip(offsets, stops))
+
+def message_bytes(mm: mmap.mmap, extents: Tuple[int, int]) -> bytes:
+    """
+    Return the raw bytes of the message at extents in a memory-mapped MBOX, without its 'From ' line.
+    """
+    start, stop = extents
+    return mm[mm.find(b"\n", start, stop) + 1 or stop:stop]
+
+FINGERPRINT_FILE = 'mbox_fingerprints.json'
+# Minimum time between progress reports from MBoxIndexer, which would otherwise report every message
+PROGRESS_MIN_INTERVAL = 0.05
+# Per-label message counts, written alongside the index once it is complete
+AGGREGATE_LABELS_FILE = 'aggregate_labels.json'
+
+def decode_header_value(val: Optional[str]) -> str:
+    """
+    Decode an RFC 2047 encoded header into a plain string, falling back to the raw value.
+    """
+    if not val:
+        return ''
+    # Most headers have no encoded words, and decode_header would return them unchanged
+    if isinstance(val, str) and '=?' not in val:
+        return val
+    try:
+        return str(make_header(decode_header(val)))
+    except Exception:
+        return val
+
+def normalise_label(label: str) -> str:
+    """
+    Collapse all whitespace in a Gmail label (including folded line breaks) to single spaces.
+    """
+    return _WHITESPACE_RE.sub(' ', label).strip()
+
+def mbox_fingerprint(mbox_path: str) -> Dict[str, Any]:
+    """
+    Cheap identity for an MBOX file: if its size and mtime are unchanged, an existing index is still valid.
+    """
+    st = os.stat(mbox_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def index_is_current(index_dir: str, mbox_files: List[str]) -> bool:
+    """
+    Return True if index_dir was completely built from mbox_files as they are now on disk.
+    """
+    fp_path = os.path.join(index_dir, FINGERPRINT_FILE)
+    try:
+        with open(fp_path, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        return all(recorded.get(os.path.basename(p)) == mbox_fingerprint(p) for p in mbox_files)
+    except (OSError, ValueError):
+        return False
+
+def message_body_text(msg: EmailMessage) -> str:
+    """
+    Return the decoded text/plain content of msg, concatenating the text/plain parts of a multipart message.
+    """
+    if msg.is_multipart():
+        # Joined once at the end; each part keeps its own charset, as parts of one message can differ
+        parts = []
+        for part in msg.walk():
+            if part.get_content_type() == 'text/plain':
+                try:
+                    payload = part.get_payload(decode=True)
+                    if isinstance(payload, bytes):
+                        parts.append(payload.decode(part.get_content_charset() or 'utf-8', errors='replace'))
+                    elif isinstance(payload, str):
+                        parts.append(payload)
+                except Exception:
+                    continue
+        return ''.join(parts)
+    try:
+        payload = msg.get_payload(decode=True)
+        if isinstance(payload, bytes):
+            return payload.decode(msg.get_content_charset() or 'utf-8', errors='replace')
+        elif isinstance(payload, str):
+            return payload
+        return ''
+    except Exception:
+        return ''
+
+_INDEXED_HEADERS = frozenset(('subject', 'from', 'to', 'date', 'message-id'))
+
+def parse_message_fields(raw: bytes) -> Dict[str, Any]:
+    """
+    Parse a raw message (without its 'From ' line) into the fields indexed for it.
+    Labels are normalised and comma-joined, as stored in the index.
+    """
+    msg = message_from_bytes(raw)
+    # One pass over the headers, rather than a scan of them all for each header looked up;
+    # like msg.get(), the first occurrence of a header wins
+    headers: Dict[str, Any] = {}
+    labels = set()
+    for name, value in msg.items():
+        name = name.lower()
+        if name == 'x-gmail-labels':
+            for label in value.split(','):
+                label = normalise_label(label)
+                if label:
+                    labels.add(label)
+        elif name in _INDEXED_HEADERS and name not in headers:
+            headers[name] = value
+    date = decode_header_value(headers.get('date'))
+    try:
+        date_parsed = parsedate_to_datetime(date) if date else None
+    except Exception:
+        date_parsed = None
+    return dict(
+        subject=decode_header_value(headers.get('subject')),
+        sender=decode_header_value(headers.get('from')),
+        recipients=decode_header_value(headers.get('to')),
+        date=date_parsed,
+        body=message_body_text(msg),
+        labels=",".join(sorted(labels)),
+        message_id=decode_header_value(headers.get('message-id'))
+    )
+
+# Each parse worker maps the MBOX itself, so only extents and parsed fields cross the process boundary
+_worker_mm: Optional[mmap.mmap] = None
+
+def _open_parse_worker(mbox_path: str) -> None:
+    global _worker_mm
+    with open(mbox_path, 'rb') as f:
+        _worker_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _advise_sequential(_worker_mm)
+
+def _parse_extents_chunk(chunk: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    return [parse_message_fields(message_bytes(_worker_mm, extents)) for extents in chunk]
+
+def _parse_in_pool(pool: ProcessPoolExecutor, extents: List[Tuple[int, int]], window: int) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the parsed fields of each message, in order, keeping at most window chunks in flight.
+    Unlike Executor.map, which submits everything at once, this doesn't buffer parsed bodies faster than
+    the writer consumes them.
+    """
+    chunks = (extents[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(extents), PARSE_CHUNK_SIZE))
+    pending = deque(pool.submit(_parse_extents_chunk, chunk) for chunk in islice(chunks, window))
+    while pending:
+        parsed = pending.popleft().result()
+        # Keep the workers busy while this chunk is written
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append(pool.submit(_parse_extents_chunk, chunk))
+        yield from parsed
+
+@functools.lru_cache(maxsize=STEM_CACHE_SIZE)
+def cached_stem(word: str) -> str:
+    """
+    Porter-stem a word, caching the most recent words; word frequencies are skewed, so most lookups hit.
+    """
+    return stem(word)
+
+def text_analyzer(stemming: bool = True) -> Analyzer:
+    """
+    Return the analyzer for the subject and body fields: English stemming (so 'meeting' finds 'meetings'),
+    or plain tokenising and lowercasing, which indexes faster and keeps words exactly as written.
+    """
+    if not stemming:
+        return StandardAnalyzer()
+    analyzer = StemmingAnalyzer()
+    # The schema pickles Whoosh's own stem function, so any index opens without this module. Only the
+    # filter's runtime cache, which isn't pickled, is swapped: Whoosh's is a pure-Python LFU, and the
+    # C lru_cache in cached_stem is cheaper per hit
+    for item in analyzer.items:
+        if isinstance(item, StemFilter):
+            item._stem = cached_stem
+    return analyzer
+
+def load_aggregate_labels(index_dir: str) -> Mapping[str, int]:
+    """
+    Return the label -> message count mapping saved with the index, or an empty mapping if there is none.
+    The mapping is shared between callers until the file changes, so it is read-only.
+    """
+    path = os.path.join(index_dir, AGGREGATE_LABELS_FILE)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return MappingProxyType({})
+    return _read_aggregate_labels(path, st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=32)
+def _read_aggregate_labels(path: str, mtime_ns: int, size: int) -> Mapping[str, int]:
+    # mtime and size are only part of the cache key, so a rewritten file is read again
+    try:
+        # One read and a parse of the whole buffer
+        with open(path, 'rb') as f:
+            return MappingProxyType(json.loads(f.read()))
+    except (OSError, ValueError):
+        return MappingProxyType({})
+
 class MBoxIndexer(threading.Thread):
     """
     Indexes one or more MBOX files in a background thread, reporting progress and allowing per-message hooks.
@@ -37,25 +336,40 @@ class MBoxIndexer(threading.Thread):
         mbox_files: List[str],
         index_dir: str,
         progress_callback: Optional[Callable[[str, int, int], None]] = None,
-        message_callback: Optional[Callable[[str, int, EmailMessage], None]] = None,
+        message_callback: Optional[Callable[[str, int, List[str]], None]] = None,
         status_callback: Optional[Callable[[str], None]] = None,
-        extra: Optional[Dict[str, Any]] = None
+        extra: Optional[Dict[str, Any]] = None,
+        done_callback: Optional[Callable[[], None]] = None,
+        limitmb: int = 256,
+        procs: int = 4,
+        stemming: bool = True,
+        parse_procs: int = 1
     ):
         super().__init__()
         self.mbox_files = mbox_files
         self.index_dir = index_dir
         self.progress_callback = progress_callback
+        # Called with each message's normalised labels, as parsed for the index
         self.message_callback = message_callback
         self.status_callback = status_callback
+        # Called from the indexer thread once run() finishes, however it finishes
+        self.done_callback = done_callback
+        # Whoosh writer batching: limitmb is the indexing memory budget of each of the procs writer processes
+        self.limitmb = limitmb
+        self.procs = procs
+        # Messages are parsed in this many worker processes (for a large MBOX) and fed to the writer in order
+        self.parse_procs = parse_procs
         self.extra = extra or {}
         self._stop_event = threading.Event()
 
         self.schema = Schema(
-            subject=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+            subject=TEXT(stored=True, analyzer=text_analyzer(stemming)),
             sender=TEXT(stored=True),
             recipients=TEXT(stored=True),
             date=DATETIME(stored=True),
-            body=TEXT(stored=True, analyzer=StemmingAnalyzer()),
+            # The body is searchable but not stored: it is read back from the MBOX by its extents when displayed,
+            # rather than keeping a second copy of every message in the index
+            body=TEXT(stored=False, analyzer=text_analyzer(stemming)),
             mbox_file=ID(stored=True),
             msg_key=ID(stored=True, unique=True),
             mbox_message_extents=STORED(),
@@ -64,12 +378,34 @@ class MBoxIndexer(threading.Thread):
         )
 
 
+    def _scan_progress(self, mbox_path: str) -> Optional[Callable[[int], None]]:
+        # Adapts the scanner's percentages to progress_callback, reported only when the percentage changes
+        progress_callback = self.progress_callback
+        if not progress_callback:
+            return None
+        last_percent = -1
+        def report(percent: int) -> None:
+            nonlocal last_percent
+            if percent != last_percent:
+                last_percent = percent
+                progress_callback(mbox_path, percent, 0)
+        return report
+
     def stop(self) -> None:
         self._stop_event.set()
 
     def run(self) -> None:
+        try:
+            self._index()
+        finally:
+            if self.done_callback:
+                self.done_callback()
+
+    def _index(self) -> None:
         logger = logging.getLogger(__name__)
         aggregate_label_counts = {}
+        # MBOX files that couldn't be indexed; they get no fingerprint, so their index is never reused
+        skipped = set()
         # Remove any existing index directory and its contents
         if os.path.exists(self.index_dir):
             import shutil
@@ -80,110 +416,72 @@ class MBoxIndexer(threading.Thread):
             ix = create_in(self.index_dir, self.schema)
         except Exception:
             ix = open_dir(self.index_dir)
-        # Performance: set StemmingAnalyzer cachesize to -1 (unbounded)
-        for fieldname, field in self.schema.items():
-            if hasattr(field, 'format') and hasattr(field.format, 'analyzer') and field.format.analyzer:
-                analyzer = field.format.analyzer
-                analyzer.cachesize = -1
-                if hasattr(analyzer, 'clear'):
-                    analyzer.clear()
         # Use batch writer settings for speed
-        writer = ix.writer(limitmb=256, procs=4, multisegment=True)
+        writer = ix.writer(limitmb=self.limitmb, procs=self.procs, multisegment=True)
         for mbox_path in self.mbox_files:
             if not os.path.exists(mbox_path):
                 continue
             if self.status_callback:
-                self.status_callback(f"Opening MBOX and building Table of Contents: {mbox_path}")
+                self.status_callback(f"Scanning for messages in: {mbox_path}")
             logger.info(f"Opening MBOX {mbox_path!r}")
-            # TODO: Make a custom MBox class that doesn't use a TOC
-            mbox = mailbox.mbox(mbox_path)
-            if self.status_callback:
-                self.status_callback(f"Indexing messages in: {mbox_path}")
             mbox_file_size = os.path.getsize(mbox_path)
+            mbox_file = os.path.basename(mbox_path)
             processed = 0
-            for i, (key, msg) in enumerate(mbox.iteritems()):
-                if self._stop_event.is_set():
-                    writer.commit()
-                    return
-                if self.message_callback:
-                    self.message_callback(mbox_path, i, msg)
-                # Parse headers using email.parser for proper unfolding and decoding
-                if not isinstance(msg, EmailMessage):
-                    # Defensive: parse raw message if not already EmailMessage
-                    raw = mbox.get_string(key)
-                    msg = Parser().parsestr(raw)
-                # Aggregate X-Gmail-Labels for this message
-                label_headers = msg.get_all('X-Gmail-Labels', [])
-                import re
-                labels = set()
-                for header in label_headers:
-                    for label in header.split(','):
-                        label = re.sub(r'\s+', ' ', label).strip()
-                        if label:
-                            aggregate_label_counts[label] = aggregate_label_counts.get(label, 0) + 1
-                            labels.add(label)
-                # Properly decode headers
-                def decode_header_value(val):
-                    if not val:
-                        return ''
-                    try:
-                        return str(make_header(decode_header(val)))
-                    except Exception:
-                        return val
-                subject = decode_header_value(msg.get('subject', ''))
-                sender = decode_header_value(msg.get('from', ''))
-                recipients = decode_header_value(msg.get('to', ''))
-                date = decode_header_value(msg.get('date', ''))
-                message_id = decode_header_value(msg.get('message-id', ''))
+            last_percent = -1
+            last_report = 0.0
+            try:
+                # The scan of a multi-GB MBOX takes a while too, so it reports progress before any message is indexed
+                extents = mbox_message_extents(mbox_path, workers=self.parse_procs, progress_callback=self._scan_progress(mbox_path))
+            except ValueError as e:
+                logger.warning(str(e))
+                if self.status_callback:
+                    self.status_callback(str(e))
+                skipped.add(mbox_path)
+                continue
+            if not extents:
+                continue
+            if self.status_callback:
+                self.status_callback(f"Indexing messages in: {mbox_path}")
+            pool = None
+            with open(mbox_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                _advise_sequential(mm)
                 try:
-                    date_parsed = parsedate_to_datetime(date) if date else None
-                except Exception:
-                    date_parsed = None
-                if msg.is_multipart():
-                    body = ''
-                    for part in msg.walk():
-                        if part.get_content_type() == 'text/plain':
-                            try:
-                                payload = part.get_payload(decode=True)
-                                if isinstance(payload, bytes):
-                                    body += payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
-                                elif isinstance(payload, str):
-                                    body += payload
-                            except Exception:
-                                continue
-                else:
-                    try:
-                        payload = msg.get_payload(decode=True)
-                        if isinstance(payload, bytes):
-                            body = payload.decode(msg.get_content_charset() or 'utf-8', errors='replace')
-                        elif isinstance(payload, str):
-                            body = payload
-                        else:
-                            body = ''
-                    except Exception:
-                        body = ''
-                mbox_message_extents = mbox._lookup(key)
-                writer.add_document(
-                    subject=subject,
-                    sender=sender,
-                    recipients=recipients,
-                    date=date_parsed,
-                    body=body,
-                    mbox_file=os.path.basename(mbox_path),
-                    msg_key=f"{os.path.basename(mbox_path)}:{key}",
-                    mbox_message_extents=mbox_message_extents,
-                    labels=",".join(sorted(labels)),
-                    message_id=message_id
-                )
-                processed += 1
-                # Progress: use file offset if available
-                if mbox_message_extents and isinstance(mbox_message_extents, tuple):
-                    file_offset = mbox_message_extents[0]
-                    percent = min(100, int(100 * file_offset / mbox_file_size)) if mbox_file_size else 0
-                else:
-                    percent = 0
-                if self.progress_callback:
-                    self.progress_callback(mbox_path, percent, processed)
+                    if self.parse_procs > 1 and mbox_file_size >= PARALLEL_PARSE_MIN_BYTES:
+                        pool = ProcessPoolExecutor(max_workers=self.parse_procs, initializer=_open_parse_worker, initargs=(mbox_path,))
+                        parsed = _parse_in_pool(pool, extents, window=2 * self.parse_procs)
+                    else:
+                        parsed = (parse_message_fields(message_bytes(mm, e)) for e in extents)
+                    # Hoisted out of the loop, which runs once per message
+                    stopped = self._stop_event.is_set
+                    add_document = writer.add_document
+                    message_callback = self.message_callback
+                    progress_callback = self.progress_callback
+                    for key, (extent, fields) in enumerate(zip(extents, parsed)):
+                        if stopped():
+                            writer.commit()
+                            return
+                        labels = fields['labels'].split(',') if fields['labels'] else []
+                        for label in labels:
+                            aggregate_label_counts[label] = aggregate_label_counts.get(label, 0) + 1
+                        if message_callback:
+                            message_callback(mbox_path, key, labels)
+                        add_document(
+                            mbox_file=mbox_file,
+                            msg_key=f"{mbox_file}:{key}",
+                            mbox_message_extents=extent,
+                            **fields
+                        )
+                        processed += 1
+                        percent = min(100, extent[0] * 100 // mbox_file_size)
+                        if progress_callback and percent != last_percent:
+                            now = time.monotonic()
+                            if now - last_report >= PROGRESS_MIN_INTERVAL:
+                                last_percent = percent
+                                last_report = now
+                                progress_callback(mbox_path, percent, processed)
+                finally:
+                    if pool is not None:
+                        pool.shutdown(cancel_futures=True)
             if self.status_callback:
                 self.status_callback(f"Finalising indexing: {mbox_path}")
         writer.commit()
@@ -194,13 +492,16 @@ class MBoxIndexer(threading.Thread):
             self.status_callback("All MBOX files indexed.")
         # Save aggregate label counts to JSON in the index directory
         if aggregate_label_counts:
-            agg_path = os.path.join(self.index_dir, 'aggregate_labels.json')
+            agg_path = os.path.join(self.index_dir, AGGREGATE_LABELS_FILE)
             with open(agg_path, 'w', encoding='utf-8') as f:
                 json.dump(aggregate_label_counts, f, indent=2, sort_keys=True)
+        # Record what was indexed last, so a complete index is only reused while the MBOX is unchanged
+        fingerprints = {os.path.basename(p): mbox_fingerprint(p) for p in self.mbox_files if os.path.exists(p) and p not in skipped}
+        with open(os.path.join(self.index_dir, FINGERPRINT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(fingerprints, f, indent=2, sort_keys=True)
 
 if __name__ == "__main__":
     import sys
-    import time
     import logging
     from collections import Counter
 
@@ -217,7 +518,6 @@ if __name__ == "__main__":
     index_dir = sys.argv[1]
     mbox_files = sys.argv[2:]
 
-    label_set = set()
     label_counter = Counter()
 
     def progress_callback(mbox_path: str, percent: int, processed: int):
@@ -226,16 +526,8 @@ if __name__ == "__main__":
         else:
             print(f"\rIndexing {os.path.basename(mbox_path)}: {percent}% ({processed} messages)", end="", flush=True)
 
-    def message_callback(mbox_path: str, idx: int, msg: EmailMessage):
-        import re
-        label_headers = msg.get_all('X-Gmail-Labels', [])
-        for header in label_headers:
-            for label in header.split(','):
-                # Collapse all whitespace (including line breaks) to a single space
-                label = re.sub(r'\s+', ' ', label).strip()
-                if label:
-                    label_set.add(label)
-                    label_counter[label] += 1
+    def message_callback(mbox_path: str, idx: int, labels: List[str]):
+        label_counter.update(labels)
 
     def status_callback(msg: str):
         print(f"[STATUS] {msg}")
@@ -246,7 +538,8 @@ if __name__ == "__main__":
         index_dir=index_dir,
         progress_callback=progress_callback,
         message_callback=message_callback,
-        status_callback=status_callback
+        status_callback=status_callback,
+        parse_procs=os.cpu_count() or 1
     )
     indexer.start()
     while indexer.is_alive():
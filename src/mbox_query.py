@@ -15,12 +15,17 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from typing import BinaryIO, Iterable, List, Optional, Dict, Any
 from whoosh.index import open_dir
 from whoosh.qparser import MultifieldParser, OrGroup
-from whoosh.query import Query
-from whoosh.searching import Results
+from whoosh.query import Query, Term
+from whoosh.searching import Searcher
 from email.message import EmailMessage
+from mbox_indexer import load_aggregate_labels, message_body_text
+
+# Number of recent searches whose hits are kept, so repeating a query doesn't run it again
+SEARCH_CACHE_SIZE = 128
 
 class MBoxQuery:
     """
@@ -31,41 +36,78 @@ class MBoxQuery:
             raise FileNotFoundError(f"Index directory not found: {index_dir}")
         self.ix = open_dir(index_dir)
         self.default_fields = ["subject", "body", "sender", "recipients"]
+        # Opening a searcher reads every segment's metadata, so one is shared by all queries until close()
+        self._searcher: Optional[Searcher] = None
+        self._parsers: Dict[tuple, MultifieldParser] = {}
+        # Least recently used search first; only valid for the searcher it was filled from
+        self._search_cache: OrderedDict[tuple, List[Dict[str, Any]]] = OrderedDict()
+
+    def searcher(self) -> Searcher:
+        """
+        Return the searcher shared by all queries on this index, opening it on first use.
+        """
+        if self._searcher is None:
+            self._searcher = self.ix.searcher()
+        return self._searcher
 
-    def search(self, query_str: str, limit: int = 50, fields: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> Results:
+    def close(self) -> None:
+        """
+        Close the shared searcher and release the index files, e.g. before the index is rebuilt.
+        """
+        if self._searcher is not None:
+            self._searcher.close()
+            self._searcher = None
+        self._search_cache.clear()
+
+    def _parser(self, fields: List[str]) -> MultifieldParser:
+        key = tuple(fields)
+        parser = self._parsers.get(key)
+        if parser is None:
+            parser = self._parsers[key] = MultifieldParser(fields, schema=self.ix.schema, group=OrGroup)
+        return parser
+
+    def search(self, query_str: str, limit: int = 50, fields: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Search the index for the given query string.
         :param query_str: The search query string.
         :param limit: Maximum number of results to return.
         :param fields: List of fields to search (defaults to subject, body, sender, recipients).
         :param filters: Optional dictionary of field:value pairs to filter results.
-        :return: Whoosh Results object.
-        """
-        with self.ix.searcher() as searcher:
-            parser = MultifieldParser(fields or self.default_fields, schema=self.ix.schema, group=OrGroup)
-            query: Query = parser.parse(query_str)
-            # Apply filters if provided
-            if filters:
-                from whoosh.query import And, Term
-                filter_query = And([Term(field, str(value)) for field, value in filters.items()])
-                query = query & filter_query
-            results = searcher.search(query, limit=limit)
-            # Return a list of dicts for each hit
-            return [dict(hit) for hit in results]
+        :return: List of dicts of the stored fields of each hit, plus its docnum. The same list is returned
+            for a repeated search, so callers must not modify it.
+        """
+        key = (query_str, limit, tuple(fields) if fields else None, tuple(sorted(filters.items())) if filters else None)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            self._search_cache.move_to_end(key)
+            return cached
+        query: Query = self._parser(fields or self.default_fields).parse(query_str)
+        # Apply filters if provided
+        if filters:
+            from whoosh.query import And
+            filter_query = And([Term(field, str(value)) for field, value in filters.items()])
+            query = query & filter_query
+        results = self.searcher().search(query, limit=limit)
+        # Return a list of dicts for each hit, with the docnum that identifies it within this index
+        hits = [dict(hit, docnum=hit.docnum) for hit in results]
+        self._search_cache[key] = hits
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return hits
+
+    def doc_count(self) -> int:
+        """
+        Return the number of documents in the index; docnums range from 0 to this value.
+        """
+        return self.ix.doc_count_all()
 
     def get_labels(self) -> List[str]:
         """
         Return a list of all unique labels (from aggregate_labels.json if present).
         """
-        agg_path = os.path.join(self.ix.storage.folder, 'aggregate_labels.json')
-        if os.path.exists(agg_path):
-            import json
-            with open(agg_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return sorted(data.keys(), key=lambda s: s.lower())
-        return []
+        return sorted(load_aggregate_labels(self.ix.storage.folder), key=str.lower)
 
-    def highlights(self, message_id: Optional[str] = None, docnum: Optional[int] = None, query_str: Optional[str] = None, field: str = "body", top: int = 10) -> Optional[List[str]]:
+    def highlights(self, message_id: Optional[str] = None, docnum: Optional[int] = None, query_str: Optional[str] = None, field: str = "body", top: int = 10, text: Optional[str] = None) -> Optional[List[str]]:
         """
         Return highlighted fragments for a message given its message_id or docnum and a query string.
         :param message_id: The Message-ID of the message (preferred if available).
@@ -73,38 +115,80 @@ class MBoxQuery:
         :param query_str: The search query string to highlight terms for.
         :param field: The field to highlight (default: body).
         :param top: The number of top fragments to return.
+        :param text: The field's text, if the caller already has it; the body is otherwise read from the MBOX.
         :return: List of highlighted fragments, or None if not found or no highlights.
         """
         from whoosh.highlight import UppercaseFormatter
         if not query_str:
             return None
-        with self.ix.searcher() as searcher:
-            parser = MultifieldParser(self.default_fields, schema=self.ix.schema, group=OrGroup)
-            query = parser.parse(query_str)
-            if message_id is not None:
-                results = searcher.search(query, limit=None)
-                results.formatter = UppercaseFormatter()
-                for hit in results:
-                    if hit.get("message_id") == message_id:
-                        fragments = hit.highlights(field, top=top, text=hit.get(field, None))
-                        if fragments:
-                            return [fragments]
-                        else:
-                            return None
-                return None
-            elif docnum is not None:
-                doc = searcher.stored_fields(docnum)
-                results = searcher.search(query, limit=None)
-                for hit in results:
-                    if hit.docnum == docnum:
-                        fragments = hit.highlights(field, top=top, text=hit.get(field, None))
-                        if fragments:
-                            return [fragments]
-                        else:
-                            return None
-                return None
-            else:
-                return None
+        searcher = self.searcher()
+        query = self._parser(self.default_fields).parse(query_str)
+        # Restrict the search to the one document, so the posting lists are intersected with it
+        # instead of scoring every match and scanning the hits for the message
+        if message_id is not None:
+            results = searcher.search(query, filter=Term("message_id", message_id), limit=1)
+        elif docnum is not None:
+            results = searcher.search(query, filter={docnum}, limit=1)
+        else:
+            return None
+        results.formatter = UppercaseFormatter()
+        for hit in results:
+            if text is None:
+                text = self.message_body(hit) if field == "body" else hit.get(field, None)
+            fragments = hit.highlights(field, top=top, text=text)
+            if fragments:
+                return [fragments]
+        return None
+
+    def export_mbox(self, docnums: Iterable[int], out_path: str) -> int:
+        """
+        Write the verbatim source of the given documents, including their 'From ' lines, to a new MBOX file.
+        Messages are copied byte-for-byte from the source MBOX using the stored extents; nothing is re-parsed.
+        :param docnums: Whoosh docnums of the messages to export, in the order to write them.
+        :param out_path: Path of the MBOX file to create.
+        :return: The number of messages written.
+        """
+        mbox_dir = os.path.dirname(self.ix.storage.folder)
+        sources: Dict[str, BinaryIO] = {}
+        written = 0
+        searcher = self.searcher()
+        try:
+            with open(out_path, 'wb') as out:
+                for docnum in docnums:
+                    fields = searcher.stored_fields(docnum)
+                    mbox_file = fields.get('mbox_file')
+                    extents = fields.get('mbox_message_extents')
+                    if not mbox_file or not extents:
+                        continue
+                    src = sources.get(mbox_file)
+                    if src is None:
+                        src = sources[mbox_file] = open(os.path.join(mbox_dir, mbox_file), 'rb')
+                    start, stop = extents
+                    src.seek(start)
+                    out.write(src.read(stop - start))
+                    # Like mailbox.mbox, extents stop before the blank line that separates a message from the next
+                    out.write(b'\n')
+                    written += 1
+        finally:
+            for src in sources.values():
+                src.close()
+        return written
+
+    def message_body(self, fields: Dict[str, Any]) -> str:
+        """
+        Return the plain-text body of an indexed message, read from its MBOX using the stored extents.
+        :param fields: The stored fields of the message (a search hit).
+        :return: The decoded text/plain body, or an empty string if the message can't be read.
+        """
+        mbox_file = fields.get('mbox_file')
+        extents = fields.get('mbox_message_extents')
+        if not mbox_file or not extents:
+            return ''
+        mbox_path = os.path.join(os.path.dirname(self.ix.storage.folder), mbox_file)
+        try:
+            return message_body_text(self.extract_message_by_extents(mbox_path, tuple(extents)))
+        except OSError:
+            return ''
 
     def extract_message_by_extents(self, mbox_path: str, extents: tuple) -> 'EmailMessage':
         """
@@ -203,5 +287,5 @@ if __name__ == "__main__":
                 print(f"    Message-ID: {message_id}")
                 print(f"    Labels: {', '.join(labels)}")
                 print(f"    Subject: {subj}")
-                print(f"    {hit.highlights('body', top=2)}\n")
+                print(f"    {hit.highlights('body', text=query_engine.message_body(hit), top=2)}\n")
                 print("" + "-" * 80)
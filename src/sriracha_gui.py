@@ -17,107 +17,161 @@
 import sys
 import wx
 import os
-import threading
-import json
+import re
+import functools
 import multiprocessing
-from pubsub import pub  # Use pypubsub instead
-from collections.abc import MutableSet
-from typing import Any, Iterable, Iterator, Optional, Set, List
-from mbox_indexer import MBoxIndexer
+from array import array
+from typing import Any, Callable, FrozenSet, Iterable, Iterator, Mapping, Optional
+from mbox_indexer import MBoxIndexer, index_is_current, load_aggregate_labels
 from mbox_query import MBoxQuery
 from version_info import get_version_info
 
 APP_VERSION = get_version_info()
-
-class OrderedSet(MutableSet):
-    def __init__(self, iterable: Optional[Iterable[Any]] = None):
-        self._dict = dict()
-        if iterable:
-            for value in iterable:
-                self._dict[value] = None
-    def __contains__(self, value: Any) -> bool:
-        return value in self._dict
-    def __iter__(self) -> Iterator[Any]:
-        return iter(self._dict.keys())
-    def __len__(self) -> int:
-        return len(self._dict)
-    def add(self, value: Any) -> None:
-        self._dict[value] = None
-    def discard(self, value: Any) -> None:
-        self._dict.pop(value, None)
-    def __repr__(self) -> str:
-        return f"OrderedSet({list(self._dict.keys())})"
-    def to_list(self) -> List[Any]:
-        return list(self._dict.keys())
-
-class IndexThread(threading.Thread):
-    def __init__(self, mbox_path, callback):
-        super().__init__()
-        self.mbox_path = mbox_path
-        self.callback = callback
-
-    def run(self):
-        import time
-        steps = 10
-        delay = 0.03
-        for i in range(steps + 1):
-            wx.CallAfter(pub.sendMessage, 'update_progress', value=int(i * 100 / steps))
-            time.sleep(delay)
-        wx.CallAfter(lambda: self.callback(None))
+# How often the UI picks up indexing progress posted by the indexer thread
+PROGRESS_REFRESH_MS = 50
+# Quiet period after the last keystroke before the search box runs its query
+SEARCH_DEBOUNCE_MS = 120
+# A run of path components, e.g. '/mnt/share/Takeout/Mail/All mail.mbox', in a status message
+_PATH_RE = re.compile(r'([/\\][^/\\]+)+')
+
+def shorten_path(text: str) -> str:
+    """
+    Replace any file paths in text with just their base names, to keep status messages short.
+    """
+    # Most status messages carry no path at all, so skip the regex unless a separator is present
+    if '/' not in text and '\\' not in text:
+        return text
+    return _PATH_RE.sub(_match_basename, text)
+
+def _match_basename(match: re.Match) -> str:
+    return os.path.basename(match.group(0))
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ[name]))
+    except (KeyError, ValueError):
+        return default
+
+# Whoosh writer tuning for indexing; limitmb applies to each writer process, so total memory is roughly their product
+INDEX_LIMIT_MB = _env_int('SRIRACHA_INDEX_MB', 256)
+INDEX_PROCS = _env_int('SRIRACHA_INDEX_PROCS', max(1, (os.cpu_count() or 2) // 2))
+# Processes that parse messages for the writer; the other half of the cores
+INDEX_PARSE_PROCS = _env_int('SRIRACHA_PARSE_PROCS', max(1, (os.cpu_count() or 2) - INDEX_PROCS))
+# Stemmed subject/body terms unless SRIRACHA_STEMMING=0; the choice is saved in the index's schema
+INDEX_STEMMING = os.environ.get('SRIRACHA_STEMMING', '1') != '0'
 
 class Message:
     """
     Represents a single email message, including metadata and app-specific fields.
     """
+    # One instance per message in the MBOX; slots drop the per-instance __dict__
+    __slots__ = ('subject', 'sender', 'recipients', 'date', 'body', 'labels', 'marked', 'attachments', 'msg_id', '_labels_text')
     def __init__(self, subject: str, sender: str, recipients: list[str], date: str, body: str, labels: Optional[Iterable[str]] = None, marked: bool = False, attachments: Optional[list[Any]] = None, msg_id: Any = None):
         self.subject: str = subject
         self.sender: str = sender
         self.recipients: list[str] = recipients
         self.date: str = date
         self.body: str = body
-        self.labels: Set[str] = set(labels) if labels else set()
+        # Labels repeat across thousands of messages: intern them so each is one shared string,
+        # and hold them in a frozenset, which is smaller than a set and replaced rather than mutated
+        self.labels: FrozenSet[str] = frozenset(map(sys.intern, labels)) if labels else frozenset()
         self.marked: bool = marked
         self.attachments: list[Any] = attachments or []
         self.msg_id: Any = msg_id
+        # Sorted, joined labels for display; cleared when the labels change (marking doesn't affect it)
+        self._labels_text: Optional[str] = None
     def add_label(self, label: str) -> None:
-        self.labels.add(label)
+        self.labels = self.labels | {sys.intern(label)}
+        self._labels_text = None
     def remove_label(self, label: str) -> None:
-        self.labels.discard(label)
+        self.labels = self.labels - {label}
+        self._labels_text = None
+    def labels_text(self) -> str:
+        if self._labels_text is None:
+            self._labels_text = ', '.join(sorted(self.labels))
+        return self._labels_text
     def toggle_marked(self) -> None:
         self.marked = not self.marked
     def __repr__(self) -> str:
         return f"<Message subject={self.subject!r} sender={self.sender!r} date={self.date!r} labels={sorted(self.labels)} marked={self.marked}>"
 
+def bitmap_indices(bitmap: int) -> Iterator[int]:
+    """
+    Yield the positions of the set bits in bitmap, lowest first.
+    Works through the bitmap's bytes, rather than clearing one bit at a time, which copies the int per bit.
+    """
+    for byte_idx, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, 'little')):
+        base = byte_idx << 3
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
 class MessageCollection:
     """
     Container for Message objects, with helper methods for filtering, searching, etc.
-    Maintains an ordered set of all labels present in the collection.
+    Maintains all labels present in the collection, in first-seen order, as the keys of a dict.
     """
     def __init__(self, messages: Optional[Iterable[Message]] = None, labels: Optional[Iterable[str]] = None):
         self.messages: list[Message] = list(messages) if messages else []
+        # Per-label bitmap of message positions: bit i is set when self.messages[i] carries the label,
+        # so filtering and counting are integer ORs/ANDs rather than a set intersection per message
+        self._label_bitmaps: dict[str, int] = {}
+        # Each int is built once from a byte buffer; OR-ing in one bit per message would copy the
+        # whole (N-bit) int every time
+        positions: dict[str, bytearray] = {}
+        nbytes = (len(self.messages) + 7) >> 3
+        for i, msg in enumerate(self.messages):
+            for label in msg.labels:
+                buf = positions.get(label)
+                if buf is None:
+                    buf = positions[label] = bytearray(nbytes)
+                buf[i >> 3] |= 1 << (i & 7)
+        for label, buf in positions.items():
+            self._label_bitmaps[label] = int.from_bytes(buf, 'little')
         # Aggregate labels from messages if not provided
         if labels is not None:
-            self.labels = OrderedSet(labels)
+            self.labels: dict[str, None] = dict.fromkeys(labels)
         else:
-            label_set = OrderedSet()
-            for msg in self.messages:
-                for label in msg.labels:
-                    label_set.add(label)
-            self.labels = label_set
+            self.labels = dict.fromkeys(self._label_bitmaps)
+    def _set_label_bits(self, idx: int, labels: Iterable[str]) -> None:
+        bit = 1 << idx
+        bitmaps = self._label_bitmaps
+        for label in labels:
+            bitmaps[label] = bitmaps.get(label, 0) | bit
     def add(self, message: Message) -> None:
         self.messages.append(message)
+        self._set_label_bits(len(self.messages) - 1, message.labels)
         for label in message.labels:
-            self.labels.add(label)
+            self.labels[label] = None
+    def add_label(self, idx: int, label: str) -> None:
+        """
+        Add a label to the message at idx, keeping the label bitmaps in step.
+        """
+        self.messages[idx].add_label(label)
+        self._set_label_bits(idx, (label,))
+        self.labels[label] = None
+    def remove_label(self, idx: int, label: str) -> None:
+        """
+        Remove a label from the message at idx, keeping the label bitmaps in step.
+        """
+        self.messages[idx].remove_label(label)
+        if label in self._label_bitmaps:
+            self._label_bitmaps[label] &= ~(1 << idx)
+    def labels_bitmap(self, labels: Iterable[str]) -> int:
+        """
+        Return the bitmap of messages carrying any of the given labels.
+        """
+        bitmap = 0
+        for label in labels:
+            bitmap |= self._label_bitmaps.get(label, 0)
+        return bitmap
     def get_marked(self) -> list[Message]:
         return [msg for msg in self.messages if msg.marked]
     def filter_by_labels(self, labels: Iterable[str]) -> 'MessageCollection':
-        label_set = set(labels)
-        filtered = [msg for msg in self.messages if msg.labels & label_set]
-        filtered_labels = OrderedSet()
-        for msg in filtered:
-            for label in msg.labels:
-                filtered_labels.add(label)
-        return MessageCollection(filtered, labels=filtered_labels)
+        messages = self.messages
+        # Lowest index first, so the filtered messages keep their original order
+        return MessageCollection([messages[i] for i in bitmap_indices(self.labels_bitmap(labels))])
     def __getitem__(self, idx: int) -> Message:
         return self.messages[idx]
     def __len__(self) -> int:
@@ -126,17 +180,33 @@ class MessageCollection:
         return iter(self.messages)
     def __repr__(self) -> str:
         return f"<MessageCollection n={len(self.messages)} messages>"
-    def label_visible_counts(self, enabled_labels: Set[str]) -> dict[str, int]:
+    def label_visible_counts(self, enabled_labels: Iterable[str]) -> dict[str, int]:
+        visible = self.labels_bitmap(enabled_labels)
         counts = {}
-        for message in self.messages:
-            message_is_visible = message.labels & enabled_labels
-            for label in message.labels:
-                if message_is_visible:
-                    if label not in counts:
-                        counts[label] = 0
-                    counts[label] += 1
+        for label, bitmap in self._label_bitmaps.items():
+            count = (bitmap & visible).bit_count()
+            if count:
+                counts[label] = count
         return counts
 
+class ResultsList(wx.ListCtrl):
+    """
+    Virtual message list; rows are formatted on demand, so only the visible rows are ever turned into strings.
+    """
+    def __init__(self, parent, row_text: Callable[[int], str]):
+        super().__init__(parent, style=wx.LC_REPORT|wx.LC_VIRTUAL|wx.LC_SINGLE_SEL|wx.LC_NO_HEADER)
+        self.row_text = row_text
+        self.InsertColumn(0, "Message")
+        self.Bind(wx.EVT_SIZE, self.on_size)
+    def OnGetItemText(self, item: int, col: int) -> str:
+        return self.row_text(item)
+    def GetSelection(self) -> int:
+        # Same contract as wx.ListBox: wx.NOT_FOUND (-1) when nothing is selected
+        return self.GetFirstSelected()
+    def on_size(self, event):
+        self.SetColumnWidth(0, self.GetClientSize().GetWidth())
+        event.Skip()
+
 class SearchGuideDialog(wx.Dialog):
     def __init__(self, parent):
         super().__init__(parent, title="Search Guide", style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER)
@@ -182,14 +252,44 @@ class MainFrame(wx.Frame):
     def __init__(self, parent, title: str, mbox_path: Optional[str] = None):
         super().__init__(parent, title=title, size=wx.Size(1200, 700))
         self.mbox_path: Optional[str] = mbox_path
+        self.mbox_basename: str = os.path.basename(mbox_path) if mbox_path else ""
         self.index_exists: bool = False
         self.messages: MessageCollection = MessageCollection()
-        self.enabled_labels: Set[str] = set()
-        self.aggregate_label_counts: dict[str, int] = {}
+        # Replaced, never mutated, so it can be shared and used as a key
+        self.enabled_labels: FrozenSet[str] = frozenset()
+        self.aggregate_label_counts: Mapping[str, int] = {}
         self.query_engine: Optional[MBoxQuery] = None
+        # Hits from the last search, as dicts of stored fields; empty means show self.messages
+        self._search_results: list[dict[str, Any]] = []
         self.show_highlights: bool = True  # Ensure this is always defined
+        # Column-wise view of the rows behind results_list; rebuilt only when the underlying result set changes
+        self._result_source: Any = None
+        self._result_rows: list[Any] = []
+        self._result_label_masks: list[int] = []
+        self._result_text: list[Optional[str]] = []
+        self._result_labels_union: int = 0
+        self._result_all_labelled: bool = True
+        # Visible row indices per label filter over the current result set, so revisiting a filter is free
+        self._filter_cache: dict[tuple[int, int, bool], array] = {}
+        # One byte per indexed document (by docnum): marking is a single flip, wherever the message appears
+        self._marked: bytearray = bytearray()
+        # Each label is interned to a bit position; filters are then integer masks over those bits
+        self._label_bits: dict[str, int] = {}
+        self._include_mask: int = 0
+        self._exclude_mask: int = 0
+        self.label_filter_states: dict[str, str] = {}
+        self._label_buttons: dict[str, wx.ToggleButton] = {}
+        # Badge order: aggregate_label_counts' keys sorted case-insensitively
+        self._sorted_labels: list[str] = []
+        self._sorted_labels_source: Optional[dict[str, int]] = None
+        # Badge click handlers, created once per label and reused whenever the badges are rebuilt
+        self._label_handlers: dict[str, Callable[[wx.Event], None]] = {}
+        self._visible_indices: array = array('i')
+        # Latest progress posted by the indexer thread, picked up by _progress_timer
+        self._pending_progress: Optional[int] = None
+        # Last status message the indexer thread posted, so repeats can be dropped
+        self._last_index_status: Optional[str] = None
         self.init_ui()
-        pub.subscribe(self.update_progress, 'update_progress')
         self.Bind(wx.EVT_CLOSE, self.on_close)
         if self.mbox_path:
             wx.CallAfter(self.open_mbox_path, self.mbox_path)
@@ -207,6 +307,10 @@ class MainFrame(wx.Frame):
         message_menu = wx.Menu()
         export_eml_id = wx.NewIdRef()
         export_eml_item = message_menu.Append(export_eml_id, "&Export as *.eml file...\tCtrl-E", "Export selected message as .eml file")
+        mark_id = wx.NewIdRef()
+        mark_item = message_menu.Append(mark_id, "&Mark/Unmark\tCtrl-M", "Toggle the mark on the selected message")
+        export_marked_id = wx.NewIdRef()
+        export_marked_item = message_menu.Append(export_marked_id, "Export &Marked as *.mbox file...", "Export all marked messages, verbatim, as a single .mbox file")
         menubar.Append(message_menu, "&Message")
         # View menu
         view_menu = wx.Menu()
@@ -228,6 +332,8 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self.on_search_guide_menu, search_guide_item)
         self.Bind(wx.EVT_MENU, self.on_toggle_highlights_menu, self.highlights_menu_item)
         self.Bind(wx.EVT_MENU, self.on_export_eml_menu, export_eml_item)
+        self.Bind(wx.EVT_MENU, self.on_mark_menu, mark_item)
+        self.Bind(wx.EVT_MENU, self.on_export_marked_menu, export_marked_item)
 
         panel = wx.Panel(self)
         vbox = wx.BoxSizer(wx.VERTICAL)
@@ -236,6 +342,10 @@ class MainFrame(wx.Frame):
         self.search_box = wx.TextCtrl(panel, style=wx.TE_PROCESS_ENTER)
         self.search_box.SetHint("Search emails...")
         self.search_box.Bind(wx.EVT_TEXT_ENTER, self.on_search)
+        self.search_box.Bind(wx.EVT_TEXT, self.on_search_text)
+        # Each timer needs its own id, otherwise EVT_TIMER handlers bound by source would see both
+        self._search_timer = wx.Timer(self, wx.NewIdRef())
+        self.Bind(wx.EVT_TIMER, self.on_search_timer, self._search_timer)
         self.search_box.Disable()
         hbox_search.Add(self.search_box, proportion=1, flag=wx.EXPAND|wx.ALL, border=5)
         vbox.Add(hbox_search, flag=wx.EXPAND)
@@ -244,6 +354,8 @@ class MainFrame(wx.Frame):
         self.tag_panel = wx.Panel(panel)
         self.tag_sizer = wx.WrapSizer(wx.HORIZONTAL)
         self.tag_panel.SetSizer(self.tag_sizer)
+        # Shared by every label badge rather than allocated per button
+        self._badge_font = wx.Font(12, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD)
         # Use proportion=0 so tag_panel resizes and pushes down the rest of the layout
         vbox.Add(self.tag_panel, proportion=0, flag=wx.ALL|wx.EXPAND, border=5)
 
@@ -254,8 +366,8 @@ class MainFrame(wx.Frame):
         # Left: results list
         left_panel = wx.Panel(self.splitter)
         left_sizer = wx.BoxSizer(wx.VERTICAL)
-        self.results_list = wx.ListBox(left_panel)
-        self.results_list.Bind(wx.EVT_LISTBOX, self.on_select_message)
+        self.results_list = ResultsList(left_panel, self._row_text)
+        self.results_list.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_select_message)
         self.results_list.Disable()
         left_sizer.Add(self.results_list, proportion=1, flag=wx.EXPAND|wx.ALL, border=5)
         left_panel.SetSizer(left_sizer)
@@ -293,6 +405,8 @@ class MainFrame(wx.Frame):
         self.progress = wx.Gauge(panel, range=100, size=wx.Size(200, 16))
         # self.progress.Hide()
         status_hbox.Add(self.progress, flag=wx.ALIGN_CENTER_VERTICAL|wx.ALL, border=5)
+        self._progress_timer = wx.Timer(self, wx.NewIdRef())
+        self.Bind(wx.EVT_TIMER, self.on_progress_timer, self._progress_timer)
         vbox.Add(status_hbox, flag=wx.EXPAND|wx.BOTTOM, border=2)
 
         panel.SetSizer(vbox)
@@ -300,91 +414,84 @@ class MainFrame(wx.Frame):
     def set_status(self, msg):
         self.status_msg.SetLabel(msg)
 
+    def update_title(self):
+        title = f"Sriracha — {self.mbox_basename}" if self.mbox_basename else "Sriracha"
+        # Skip the native title-bar repaint when re-indexing the same file
+        if self.GetTitle() != title:
+            self.SetTitle(title)
+
     def open_mbox_path(self, path, force_rebuild: bool = False):
+        # Stored extents are offsets in the file on disk, which a compressed MBOX can't provide
+        if path.endswith('.gz'):
+            wx.MessageBox(f"{os.path.basename(path)} is compressed. Decompress it before opening it.", "Open MBOX", wx.OK | wx.ICON_ERROR)
+            return
         self.mbox_path = path
-        self.SetTitle(f"Sriracha — {os.path.basename(path)}")
+        self.mbox_basename = os.path.basename(path)
+        self.update_title()
+        # The query engine keeps its index files open; release them before opening another index or rebuilding this one
+        if self.query_engine:
+            self.query_engine.close()
+            self.query_engine = None
+        # Hits refer to documents in the previous index
+        self._search_results = []
         mbox_dir = os.path.dirname(path)
-        mbox_base = os.path.splitext(os.path.basename(path))[0]
+        mbox_base = os.path.splitext(self.mbox_basename)[0]
         index_dir = os.path.join(mbox_dir, mbox_base + ".whoosh-index")
-        # Load aggregate label counts if present
-        agg_path = os.path.join(index_dir, 'aggregate_labels.json')
-        if os.path.exists(agg_path):
-            try:
-                with open(agg_path, 'r', encoding='utf-8') as f:
-                    self.aggregate_label_counts = json.load(f)
-            except Exception:
-                self.aggregate_label_counts = {}
-        else:
-            self.aggregate_label_counts = {}
-        if not force_rebuild and os.path.exists(index_dir):
-            self.set_status(f"Index already exists for {os.path.basename(path)}. Ready.")
+        # Reuse the index only if it was completed against this exact MBOX (same size and mtime)
+        if not force_rebuild and os.path.exists(index_dir) and index_is_current(index_dir, [path]):
+            self.set_status(f"Index already exists for {self.mbox_basename}. Ready.")
+            self.aggregate_label_counts = load_aggregate_labels(index_dir)
             self.progress.Hide()
             self.index_exists = True
             self.search_box.Enable()
             self.search_box.SetFocus()  # Ensure search box is focused
             self.results_list.Enable()
-            self.enabled_labels = set(self.aggregate_label_counts.keys())
-            self.label_filter_states = {l: 'off' for l in self.aggregate_label_counts.keys()}
+            self.enabled_labels = frozenset(self.aggregate_label_counts)
+            self.reset_label_filters(self.aggregate_label_counts.keys())
             self.update_label_badges()
             self.query_engine = MBoxQuery(index_dir)
+            self._marked = bytearray(self.query_engine.doc_count())
             return
-        self.set_status(f"Indexing {os.path.basename(path)}...")
+        self.set_status(f"Indexing {self.mbox_basename}...")
         self.progress.SetValue(0)
         self.progress.Show()
         self.index_exists = False
         self.disable_all()
         mbox_files = [path]
-        def status_callback(msg: str):
-            import re
-            def shorten_path(text):
-                return re.sub(r'([/\\][^/\\]+)+', lambda m: os.path.basename(m.group(0)), text)
-            short_msg = shorten_path(msg)
-            wx.CallAfter(self.set_status, short_msg)
-            if "indexed" in short_msg.lower() or "all mbox files indexed" in short_msg.lower() or "completed indexing" in short_msg.lower():
-                wx.CallAfter(self.progress.Hide)
-        def progress_callback(mbox_path: str, percent: int, processed: int):
-            wx.CallAfter(self.progress.SetValue, percent)
-            if percent >= 100:
-                wx.CallAfter(self.progress.Hide)
-        def message_callback(mbox_path: str, idx: int, msg):
-            pass
-        self.indexer = MBoxIndexer(
-            mbox_files=mbox_files,
-            index_dir=index_dir,
-            progress_callback=progress_callback,
-            message_callback=message_callback,
-            status_callback=status_callback
-        )
+        self._last_index_status = None
         def on_index_complete():
-            # Reload aggregate_label_counts from the new index
-            agg_path = os.path.join(index_dir, 'aggregate_labels.json')
-            if os.path.exists(agg_path):
-                try:
-                    with open(agg_path, 'r', encoding='utf-8') as f:
-                        self.aggregate_label_counts = json.load(f)
-                except Exception:
-                    self.aggregate_label_counts = {}
-            else:
-                self.aggregate_label_counts = {}
+            # Load aggregate_label_counts from the new index
+            self.aggregate_label_counts = load_aggregate_labels(index_dir)
             self.index_exists = True
             self.search_box.Enable()
             self.search_box.SetFocus()  # Ensure search box is focused
             self.results_list.Enable()
-            self.label_filter_states = {l: 'off' for l in self.aggregate_label_counts.keys()}
+            self.reset_label_filters(self.aggregate_label_counts.keys())
             self.update_label_badges()
             if self.mbox_path:
-                self.set_status(f"Indexed: {os.path.basename(self.mbox_path)}")
-                self.SetTitle(f"Sriracha — {os.path.basename(self.mbox_path)}")
+                self.set_status(f"Indexed: {self.mbox_basename}")
+                self.update_title()
             if os.path.exists(index_dir):
                 self.query_engine = MBoxQuery(index_dir)
+                self._marked = bytearray(self.query_engine.doc_count())
+            self._progress_timer.Stop()
+            self._pending_progress = None
             self.progress.Hide()
-        def wait_for_indexer():
-            if self.indexer.is_alive():
-                wx.CallLater(100, wait_for_indexer)
-            else:
-                wx.CallAfter(on_index_complete)
+        self.indexer = MBoxIndexer(
+            mbox_files=mbox_files,
+            index_dir=index_dir,
+            progress_callback=self.on_indexer_progress,
+            status_callback=self.on_indexer_status,
+            # The indexer thread signals completion straight onto the UI thread, rather than being polled
+            done_callback=functools.partial(wx.CallAfter, on_index_complete),
+            limitmb=INDEX_LIMIT_MB,
+            procs=INDEX_PROCS,
+            stemming=INDEX_STEMMING,
+            parse_procs=INDEX_PARSE_PROCS
+        )
+        self._pending_progress = None
+        self._progress_timer.Start(PROGRESS_REFRESH_MS)
         self.indexer.start()
-        wait_for_indexer()
 
     def open_mbox(self, event):
         with wx.FileDialog(self, "Select MBOX File", wildcard="MBOX files (*.mbox)|*.mbox|All files (*.*)|*.*", style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
@@ -394,13 +501,28 @@ class MainFrame(wx.Frame):
             path = fileDialog.GetPath()
             self.open_mbox_path(path)
 
-    def update_progress(self, value):
-        self.progress.SetValue(value)
-        if value == 100:
-            self.progress.Hide()
-            self.set_status("Indexing complete.")
-        else:
-            self.set_status(f"Indexing... {value}%")
+    def on_indexer_progress(self, mbox_path: str, percent: int, processed: int) -> None:
+        # Runs on the indexer thread; just record the value rather than queueing a UI event per message
+        self._pending_progress = percent
+
+    def on_indexer_status(self, msg: str) -> None:
+        # Runs on the indexer thread
+        short_msg = shorten_path(msg)
+        # Repeated messages would only queue identical status bar updates
+        if short_msg == self._last_index_status:
+            return
+        self._last_index_status = short_msg
+        wx.CallAfter(self.set_status, short_msg)
+        if "indexed" in short_msg.lower() or "all mbox files indexed" in short_msg.lower() or "completed indexing" in short_msg.lower():
+            wx.CallAfter(self.progress.Hide)
+
+    def on_progress_timer(self, event):
+        percent = self._pending_progress
+        if percent is None:
+            return
+        self._pending_progress = None
+        # The bar is hidden by on_index_complete; the scan for messages reaches 100% before indexing starts
+        self.progress.SetValue(percent)
 
     def on_index_complete(self, _=None):
         import random
@@ -422,67 +544,145 @@ class MainFrame(wx.Frame):
             labels = set(random.sample(tag_list, num_tags))
             msg = Message(subject, sender, recipients, date, body, labels=labels, marked=False, msg_id=i+1)
             self.messages.add(msg)
-        self.enabled_labels = set(self.messages.labels)
-        self.label_filter_states = {l: 'off' for l in self.aggregate_label_counts.keys()}
+        self.enabled_labels = frozenset(self.messages.labels)
+        self.reset_label_filters(self.aggregate_label_counts.keys())
+        # update_label_badges() also fills the results list, so no separate show_message_list() pass
         self.update_label_badges()
         if self.mbox_path:
-            self.set_status(f"Indexed: {os.path.basename(self.mbox_path)}")
-            self.SetTitle(f"Sriracha — {os.path.basename(self.mbox_path)}")
-        self.show_message_list()
+            self.set_status(f"Indexed: {self.mbox_basename}")
+            self.update_title()
 
     def show_message_list(self, filter_labels=None):
         # Show messages filtered by tags if provided, else all
         if filter_labels is None:
             filter_labels = self.enabled_labels
-        filtered = self.messages if not filter_labels else self.messages.filter_by_labels(filter_labels)
-        display = [f"{'* ' if msg.marked else ''}{msg.subject} [{', '.join(sorted(msg.labels))}]" for msg in filtered]
-        self.results_list.Set(display)
+        self._load_result_columns(self.messages)
+        self._show_rows(self._filtered_indices(self._labels_mask(filter_labels), match_any=True))
         self.set_status(f"Filtering by labels: {', '.join(sorted(filter_labels))}")
 
+    def reset_label_filters(self, labels: Iterable[str]) -> None:
+        self.label_filter_states = {l: 'off' for l in labels}
+        self._label_bits = {l: bit for bit, l in enumerate(sorted(self.label_filter_states))}
+        self._include_mask = 0
+        self._exclude_mask = 0
+        # Bit assignments changed, so any cached row masks are stale
+        self._result_source = None
+
+    def _label_bit(self, label: str) -> int:
+        bit = self._label_bits.get(label)
+        if bit is None:
+            bit = self._label_bits[label] = len(self._label_bits)
+        return 1 << bit
+
+    def _labels_mask(self, labels: Iterable[str]) -> int:
+        # Runs once per result row, so known labels are looked up directly rather than via _label_bit()
+        bits = self._label_bits
+        mask = 0
+        for label in labels:
+            bit = bits.get(label)
+            mask |= (1 << bit) if bit is not None else self._label_bit(label)
+        return mask
+
+    def _load_result_columns(self, rows) -> None:
+        # Reduce each row's labels to a bitmask once per result set, rather than on every filter change
+        if rows is self._result_source:
+            return
+        self._result_source = rows
+        self._result_rows = list(rows)
+        self._result_label_masks = masks = []
+        # Row text is formatted the first time a row is painted and reused across filter changes
+        self._result_text = [None] * len(self._result_rows)
+        self._filter_cache.clear()
+        append = masks.append
+        labels_mask = self._labels_mask
+        for row in self._result_rows:
+            if isinstance(row, dict):
+                labels = row.get('labels', '')
+                append(labels_mask([l for l in map(str.strip, labels.split(',')) if l]) if labels else 0)
+            else:
+                append(labels_mask(getattr(row, 'labels', ())))
+        # Every label present in the result set, and whether every row carries at least one of them
+        union = 0
+        for mask in self._result_label_masks:
+            union |= mask
+        self._result_labels_union = union
+        self._result_all_labelled = all(self._result_label_masks)
+
+    def _filtered_indices(self, include_mask: int, exclude_mask: int = 0, match_any: bool = False) -> array:
+        # match_any shows rows carrying any included label; otherwise rows must carry all of them and none excluded
+        key = (include_mask, exclude_mask, match_any)
+        indices = self._filter_cache.get(key)
+        if indices is None:
+            masks = self._result_label_masks
+            if not include_mask and not exclude_mask:
+                indices = array('i', range(len(masks)))
+            elif match_any and self._result_all_labelled and include_mask & self._result_labels_union == self._result_labels_union:
+                # Every label in the result set is enabled, so every row matches: skip the scan
+                indices = self._filtered_indices(0)
+            elif match_any:
+                indices = array('i', (i for i, mask in enumerate(masks) if mask & include_mask))
+            else:
+                indices = array('i', (
+                    i for i, mask in enumerate(masks)
+                    if mask & include_mask == include_mask and not mask & exclude_mask
+                ))
+            self._filter_cache[key] = indices
+        return indices
+
+    def _show_rows(self, indices: array) -> None:
+        # Cached filters hand back the same array, so an unchanged view needs no recount or repaint
+        if indices is self._visible_indices:
+            return
+        self._visible_indices = indices
+        self.results_list.SetItemCount(len(self._visible_indices))
+        self.results_list.Refresh()
+
+    def _row_at(self, idx: int) -> Any:
+        if 0 <= idx < len(self._visible_indices):
+            return self._result_rows[self._visible_indices[idx]]
+        return None
+
+    def _row_text(self, idx: int) -> str:
+        if not 0 <= idx < len(self._visible_indices):
+            return ""
+        i = self._visible_indices[idx]
+        text = self._result_text[i]
+        if text is None:
+            text = self._result_text[i] = self._format_row(self._result_rows[i])
+        return text
+
+    def _format_row(self, row: Any) -> str:
+        if isinstance(row, dict):
+            return f"{'* ' if self._is_marked(row) else ''}{row.get('subject', '')} [{row.get('sender', '')}]"
+        return f"{'* ' if row.marked else ''}{row.subject} [{row.labels_text()}]"
+
+    def _is_marked(self, row: Any) -> bool:
+        if isinstance(row, dict):
+            docnum = row.get('docnum')
+            return docnum is not None and docnum < len(self._marked) and bool(self._marked[docnum])
+        return row.marked
+
     def filter_results_by_labels(self):
-        # Tri-state filtering: include, exclude, off
-        include_labels = {l for l, s in self.label_filter_states.items() if s == 'include'}
-        exclude_labels = {l for l, s in self.label_filter_states.items() if s == 'exclude'}
-        # If all are off, no filtering
-        if not include_labels and not exclude_labels:
-            filtered = self._search_results if hasattr(self, '_search_results') and self._search_results else self.messages
-        else:
-            # Filter search results or in-memory messages
-            base = self._search_results if hasattr(self, '_search_results') and self._search_results else self.messages
-            filtered = []
-            for hit in base:
-                # hit can be dict (search) or Message (in-memory)
-                if isinstance(hit, dict):
-                    labels = hit.get('labels', '')
-                    labels_set = set(l.strip() for l in labels.split(',') if l.strip())
-                else:
-                    labels_set = set(getattr(hit, 'labels', []))
-                if include_labels and not (include_labels <= labels_set):
-                    continue
-                if exclude_labels and (exclude_labels & labels_set):
-                    continue
-                filtered.append(hit)
-        display = [f"{'* ' if (r.get('marked', False) if isinstance(r, dict) else r.marked) else ''}{r.get('subject', '') if isinstance(r, dict) else r.subject} [{r.get('sender', '') if isinstance(r, dict) else r.sender}]" for r in filtered]
-        self.results_list.Set(display)
-        self._filtered_results = filtered
-        if include_labels or exclude_labels:
-            self.set_status(f"Label filter: +{', '.join(sorted(include_labels))} -{', '.join(sorted(exclude_labels))} ({len(filtered)} shown)")
+        # Tri-state filtering: include, exclude, off. The masks are maintained by on_cycle_label_state,
+        # and row labels were reduced to masks when the result set was loaded, so nothing is re-split here
+        include_mask = self._include_mask
+        exclude_mask = self._exclude_mask
+        # Filter search results or in-memory messages
+        base = self._search_results or self.messages
+        self._load_result_columns(base)
+        self._show_rows(self._filtered_indices(include_mask, exclude_mask))
+        shown = len(self._visible_indices)
+        if include_mask or exclude_mask:
+            # Label names are only needed for the status message
+            include_labels = [l for l, s in self.label_filter_states.items() if s == 'include']
+            exclude_labels = [l for l, s in self.label_filter_states.items() if s == 'exclude']
+            self.set_status(f"Label filter: +{', '.join(sorted(include_labels))} -{', '.join(sorted(exclude_labels))} ({shown} shown)")
         else:
-            self.set_status(f"No label filter ({len(filtered)} shown)")
+            self.set_status(f"No label filter ({shown} shown)")
 
     def on_select_message(self, event):
-        idx = self.results_list.GetSelection()
-        if idx != wx.NOT_FOUND:
-            # Use filtered search results if present
-            if hasattr(self, '_filtered_results') and self._filtered_results and idx < len(self._filtered_results):
-                hit = self._filtered_results[idx]
-                if isinstance(hit, dict):
-                    self.show_message_content(hit)
-                    return
-            # Fallback to regular message display if no search results
-            filter_labels = self.enabled_labels
-            filtered = self.messages if not filter_labels else self.messages.filter_by_labels(filter_labels)
-            msg = filtered[idx]
+        msg = self._row_at(self.results_list.GetSelection())
+        if msg is not None:
             self.show_message_content(msg)
         else:
             self.message_view.SetValue("")
@@ -501,14 +701,18 @@ class MainFrame(wx.Frame):
                 f"Labels: {', '.join(labels_list)}"
             )
             self.headers_view.SetValue(headers)
-            if self.show_highlights and self.query_engine:
-                message_id = msg.get('message_id')
+            if not self.query_engine:
+                self.message_view.SetValue("")
+                return
+            # The index doesn't store bodies; read this one message back from the MBOX
+            body = self.query_engine.message_body(msg)
+            if self.show_highlights:
                 query = self.search_box.GetValue().strip()
-                highlights = self.query_engine.highlights(message_id=message_id, query_str=query)
+                highlights = self.query_engine.highlights(docnum=msg.get('docnum'), query_str=query, text=body)
                 if highlights:
                     self.message_view.SetValue('\n\n'.join(highlights))
                     return
-            self.message_view.SetValue(msg.get('body', ''))
+            self.message_view.SetValue(body)
         else:
             headers = (
                 f"From: {msg.sender}\n"
@@ -516,12 +720,12 @@ class MainFrame(wx.Frame):
                 f"Date: {msg.date}\n"
                 f"Subject: {msg.subject}\n"
                 f"Message-ID: {getattr(msg, 'msg_id', '')}\n"
-                f"Tags: {', '.join(sorted(msg.labels))}"
+                f"Tags: {msg.labels_text()}"
             )
             self.headers_view.SetValue(headers)
             if self.show_highlights and self.query_engine:
                 message_id = getattr(msg, 'msg_id', None)
-                query = self.search_box.GetValue().strip() if hasattr(self, 'search_box') else None
+                query = self.search_box.GetValue().strip()
                 highlights = self.query_engine.highlights(message_id=message_id, query_str=query)
                 if highlights:
                     self.message_view.SetValue('\n\n'.join(highlights))
@@ -529,47 +733,85 @@ class MainFrame(wx.Frame):
             self.message_view.SetValue(msg.body)
 
     def update_label_badges(self) -> None:
-        for child in self.tag_panel.GetChildren():
-            child.Destroy()
-        self.tag_sizer.Clear()
+        # Reconcile the badges with the current labels: only added labels get new buttons and only removed
+        # labels lose theirs; the rest are relabelled in place (see also on_cycle_label_state)
         label_counts = self.aggregate_label_counts
-        for idx, label in enumerate(sorted(label_counts.keys(), key=lambda s: s.lower())):
-            count = label_counts.get(label, 0)
-            # Remove 'Category ' prefix from button label, but keep in tooltip
-            display_label = label
-            tooltip_label = label
-            if label.lower().startswith('category '):
-                display_label = label[9:].lstrip()
-            # Tri-state: off, include, exclude
-            state = self.label_filter_states.get(label, 'off')
-            if state == 'include':
-                badge_label = f"{display_label} ({count}) +"
-            elif state == 'exclude':
-                badge_label = f"{display_label} ({count}) -"
-            else:
-                badge_label = f"{display_label} ({count})"
-            btn = wx.ToggleButton(self.tag_panel, label=badge_label)
-            btn.SetValue(state != 'off')
-            btn.Bind(wx.EVT_TOGGLEBUTTON, lambda evt, l=label: self.on_cycle_label_state(evt, l))
-            btn.SetFont(wx.Font(12, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD))
-            btn.SetToolTip(f"Filter by label: {tooltip_label}\nClick to cycle: off → include (+) → exclude (-) → off")
-            self.tag_sizer.Add(btn, flag=wx.RIGHT|wx.BOTTOM, border=4)
+        # aggregate_label_counts is only ever replaced, never updated in place, so its sort order is cached per dict
+        if self._sorted_labels_source is not label_counts:
+            self._sorted_labels = sorted(label_counts, key=str.lower)
+            self._sorted_labels_source = label_counts
+        wanted = self._sorted_labels
+        buttons = self._label_buttons
+        self.tag_panel.Freeze()
+        try:
+            for label in set(buttons) - set(label_counts):
+                buttons.pop(label).Destroy()
+            # Detach everything and re-add in sorted order; existing buttons are kept, not destroyed
+            self.tag_sizer.Clear(delete_windows=False)
+            for label in wanted:
+                btn = buttons.get(label)
+                if btn is None:
+                    btn = buttons[label] = wx.ToggleButton(self.tag_panel, label=self._badge_label(label))
+                    handler = self._label_handlers.get(label)
+                    if handler is None:
+                        handler = self._label_handlers[label] = functools.partial(self.on_cycle_label_state, label=label)
+                    btn.Bind(wx.EVT_TOGGLEBUTTON, handler)
+                    btn.SetFont(self._badge_font)
+                    btn.SetToolTip(f"Filter by label: {label}\nClick to cycle: off → include (+) → exclude (-) → off")
+                else:
+                    btn.SetLabel(self._badge_label(label))
+                btn.SetValue(self.label_filter_states.get(label, 'off') != 'off')
+                self.tag_sizer.Add(btn, flag=wx.RIGHT|wx.BOTTOM, border=4)
+            self._layout_label_badges()
+        finally:
+            self.tag_panel.Thaw()
+        self.filter_results_by_labels()
+
+    def _badge_label(self, label: str) -> str:
+        count = self.aggregate_label_counts.get(label, 0)
+        # Remove 'Category ' prefix from button label, but keep in tooltip
+        display_label = label
+        if label.lower().startswith('category '):
+            display_label = label[9:].lstrip()
+        # Tri-state: off, include, exclude
+        state = self.label_filter_states.get(label, 'off')
+        if state == 'include':
+            return f"{display_label} ({count}) +"
+        elif state == 'exclude':
+            return f"{display_label} ({count}) -"
+        return f"{display_label} ({count})"
+
+    def _layout_label_badges(self) -> None:
         self.tag_panel.Layout()
         self.tag_panel.Fit()
         self.tag_panel.Refresh()
         self.tag_panel.GetParent().Layout()
-        self.filter_results_by_labels()
 
     def on_cycle_label_state(self, event, label):
         # Cycle: off → include → exclude → off
         state = self.label_filter_states.get(label, 'off')
+        bit = self._label_bit(label)
         if state == 'off':
             self.label_filter_states[label] = 'include'
+            self._include_mask |= bit
         elif state == 'include':
             self.label_filter_states[label] = 'exclude'
+            self._include_mask &= ~bit
+            self._exclude_mask |= bit
         else:
             self.label_filter_states[label] = 'off'
-        self.update_label_badges()
+            self._exclude_mask &= ~bit
+        # Only this badge changed; update it in place rather than recreating them all
+        btn = self._label_buttons.get(label)
+        if btn:
+            self.tag_panel.Freeze()
+            try:
+                btn.SetLabel(self._badge_label(label))
+                btn.SetValue(self.label_filter_states[label] != 'off')
+                self._layout_label_badges()
+            finally:
+                self.tag_panel.Thaw()
+        self.filter_results_by_labels()
 
     def disable_all(self):
         self.search_box.Disable()
@@ -577,6 +819,10 @@ class MainFrame(wx.Frame):
         self.message_view.SetValue("")
 
     def on_close(self, event):
+        self._progress_timer.Stop()
+        self._search_timer.Stop()
+        if self.query_engine:
+            self.query_engine.close()
         self.Destroy()
         wx.GetApp().ExitMainLoop()
 
@@ -621,7 +867,17 @@ class MainFrame(wx.Frame):
         if idx != wx.NOT_FOUND:
             self.on_select_message(None)
 
+    def on_search_text(self, event):
+        # Search as the user types, but only once typing pauses
+        self._search_timer.StartOnce(SEARCH_DEBOUNCE_MS)
+        event.Skip()
+
+    def on_search_timer(self, event):
+        if self.search_box.GetValue().strip() and self.query_engine:
+            self.on_search(event)
+
     def on_search(self, event):
+        self._search_timer.Stop()
         query = self.search_box.GetValue().strip()
         if not query or not self.query_engine:
             self.set_status("No query or index loaded.")
@@ -634,7 +890,6 @@ class MainFrame(wx.Frame):
             return
         # Store results for selection, as list of dicts
         self._search_results = results
-        self._filtered_results = results  # Initially, all results are shown
         self.filter_results_by_labels()
 
     def on_rebuild_index_menu(self, event):
@@ -644,17 +899,53 @@ class MainFrame(wx.Frame):
             wx.MessageBox("No MBOX file is currently open.", "Rebuild Index", wx.OK | wx.ICON_INFORMATION)
 
 
+    def on_mark_menu(self, event):
+        idx = self.results_list.GetSelection()
+        row = self._row_at(idx)
+        if row is None:
+            wx.MessageBox("No message selected.", "Mark/Unmark", wx.OK | wx.ICON_INFORMATION)
+            return
+        if isinstance(row, dict):
+            docnum = row.get('docnum')
+            if docnum is None or docnum >= len(self._marked):
+                return
+            self._marked[docnum] ^= 1
+        else:
+            row.toggle_marked()
+        # Only this row's text changed; repaint just that row
+        self._result_text[self._visible_indices[idx]] = None
+        self.results_list.RefreshItem(idx)
+
+    def on_export_marked_menu(self, event):
+        # bytearray.find scans for set marks in C, so this costs the same however large the index is
+        marked = self._marked
+        docnums = []
+        pos = marked.find(1)
+        while pos != -1:
+            docnums.append(pos)
+            pos = marked.find(1, pos + 1)
+        if not docnums or not self.query_engine:
+            wx.MessageBox("No messages are marked.", "Export Marked", wx.OK | wx.ICON_INFORMATION)
+            return
+        with wx.FileDialog(self, "Export Marked", wildcard="MBOX files (*.mbox)|*.mbox|All files (*.*)|*.*", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT, defaultFile="marked.mbox") as fileDialog:
+            fileDialog.SetFilterIndex(0)
+            if fileDialog.ShowModal() == wx.ID_CANCEL:
+                return
+            save_path = fileDialog.GetPath()
+        try:
+            count = self.query_engine.export_mbox(docnums, save_path)
+            wx.MessageBox(f"{count} marked message(s) exported to {save_path}", "Export Marked", wx.OK | wx.ICON_INFORMATION)
+        except Exception as e:
+            wx.MessageBox(f"Failed to export marked messages: {e}", "Export Marked", wx.OK | wx.ICON_ERROR)
+
     def on_export_eml_menu(self, event):
         idx = self.results_list.GetSelection()
         if idx == wx.NOT_FOUND:
             wx.MessageBox("No message selected.", "Export as EML", wx.OK | wx.ICON_INFORMATION)
             return
-        # Get the selected message (from filtered results if present)
-        msg = None
-        if hasattr(self, '_filtered_results') and self._filtered_results and idx < len(self._filtered_results):
-            hit = self._filtered_results[idx]
-            if isinstance(hit, dict):
-                msg = hit
+        # Only search hits carry the mbox file/extents needed for export
+        hit = self._row_at(idx)
+        msg = hit if isinstance(hit, dict) else None
         if not msg:
             wx.MessageBox("No message selected or message type unsupported.", "Export as EML", wx.OK | wx.ICON_INFORMATION)
             return
@@ -0,0 +1,26 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'experiments'))
+
+from index_mbox import _strip_quotes
+
+class StripQuotesTest(unittest.TestCase):
+    def test_strips_quotes_and_signature(self):
+        self.assertEqual(_strip_quotes('Hi\n> quoted\n> more\nreply\n-- \nsig'), 'Hi\nreply\n')
+
+    def test_crlf_signature(self):
+        self.assertEqual(_strip_quotes('reply\r\n-- \r\nsig text\r\n'), 'reply\r\n')
+
+    def test_leading_signature(self):
+        self.assertEqual(_strip_quotes('-- \nsig only'), '')
+
+    def test_bare_dashes_are_kept(self):
+        self.assertEqual(_strip_quotes('Results:\n--\nA table row\n-- \nsig'), 'Results:\n--\nA table row\n')
+
+    def test_escaped_from_line_is_kept(self):
+        self.assertEqual(_strip_quotes('>From here on\n> quoted\n'), '>From here on\n')
+
+if __name__ == '__main__':
+    unittest.main()
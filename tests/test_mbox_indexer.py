@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from mbox_query import MBoxQuery
+
+def write_mbox(path, count=5):
+    with open(path, 'wb') as f:
+        for i in range(count):
+            f.write(
+                f"From sender{i}@example.com Mon Jan  1 00:00:00 2024\n"
+                f"From: sender{i}@example.com\n"
+                f"To: me@example.com\n"
+                f"Subject: Meeting {i}\n"
+                f"X-Gmail-Labels: Inbox,Work\n"
+                f"\n"
+                f"Notes from the meetings about widgets.\n"
+                f"\n".encode()
+            )
+
+class CliIndexTest(unittest.TestCase):
+    def test_index_built_by_cli_reopens(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            mbox_path = os.path.join(tmp, 'test.mbox')
+            index_dir = os.path.join(tmp, 'index')
+            write_mbox(mbox_path)
+            # Run as a script, so the indexer module is __main__ while the schema is pickled
+            subprocess.run([sys.executable, os.path.join(SRC_DIR, 'mbox_indexer.py'), index_dir, mbox_path],
+                           check=True, capture_output=True)
+            query = MBoxQuery(index_dir)
+            try:
+                # 'meeting' only matches 'meetings' in the bodies through the stemmer
+                hits = query.search('meeting', fields=['body'])
+                self.assertEqual(len(hits), 5)
+                self.assertEqual(sorted(hit['subject'] for hit in hits), [f"Meeting {i}" for i in range(5)])
+            finally:
+                query.close()
+
+if __name__ == '__main__':
+    unittest.main()